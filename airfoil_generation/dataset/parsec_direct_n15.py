@@ -1,8 +1,21 @@
 import math
+from functools import lru_cache
+
 import numpy as np
-from numpy.linalg import lstsq
 from scipy.optimize import minimize
-from scipy.special import factorial
+from scipy.special import comb
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba is optional: without it the kernels below run as plain NumPy
+    prange = range
+
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+
+        return decorator
 
 
 class CSTLayer:
@@ -23,6 +36,9 @@ class CSTLayer:
         self.n2 = n2
         self.n_cst = n_cst
         self.A0 = self.A0_matrix()
+        # pseudoinverse of the fixed design matrix, so each fit is a single
+        # matmul instead of a full SVD through lstsq
+        self.A0_pinv = np.linalg.pinv(self.A0)
 
     def A0_matrix(self):
         """
@@ -31,14 +47,10 @@ class CSTLayer:
         n = self.n_cst
         n1 = self.n1
         n2 = self.n2
-        n_x = self.n_x
         x = self.x_coords
-        k = np.zeros(n + 1)
-        A0 = np.zeros([n + 1, n_x])
-
-        for r in range(n + 1):
-            k[r] = factorial(n) / factorial(r) / factorial(n - r)
-            A0[r, :] = k[r] * x ** (n1 + r) * (1 - x) ** (n + n2 - r)
+        r = np.arange(n + 1)[:, None]
+        k = comb(n, np.arange(n + 1))[:, None]
+        A0 = k * x[None, :] ** (n1 + r) * (1 - x)[None, :] ** (n + n2 - r)
         return A0.T
 
     def derivative_matrix(self):
@@ -51,58 +63,198 @@ class CSTLayer:
         n = self.n_cst
         n1 = self.n1
         n2 = self.n2
-        n_x = self.n_x - 2
-        x = self.x_coords[1:-1]
-        k = np.zeros(n + 1)
-        A1 = np.zeros([n + 1, n_x])
-        A2 = np.zeros([n + 1, n_x])
-
-        for r in range(n + 1):
-            k[r] = factorial(n) / factorial(r) / factorial(n - r)
-            A1[r, :] = k[r] * (
-                -(x ** (n1 + r - 1))
-                * (1 - x) ** (n + n2 - r - 1)
-                * (x * (n + n2 - r) + (n1 + r) * (x - 1))
-            )
-            A2[r, :] = k[r] * (
-                x ** (n1 + r - 2)
-                * (1 - x) ** (n + n2 - r - 2)
-                * (
-                    x**2 * (-n + n2**2 + 2 * n2 * (n - r) - n2 + r + (n - r) ** 2)
-                    + 2 * x * (x - 1) * (n1 * n2 + n1 * (n - r) + n2 * r + r * (n - r))
-                    + (x - 1) ** 2 * (n1**2 + 2 * n1 * r - n1 + r**2 - r)
-                )
-            )
+        x = self.x_coords[1:-1][None, :]
+        r = np.arange(n + 1)[:, None]
+        k = comb(n, np.arange(n + 1))[:, None]
+        base = x ** (n1 + r - 2) * (1 - x) ** (n + n2 - r - 2)
+        A1 = (
+            -k
+            * base
+            * x
+            * (1 - x)
+            * (x * (n + n2 - r) + (n1 + r) * (x - 1))
+        )
+        A2 = k * base * (
+            x**2 * (-n + n2**2 + 2 * n2 * (n - r) - n2 + r + (n - r) ** 2)
+            + 2 * x * (x - 1) * (n1 * n2 + n1 * (n - r) + n2 * r + r * (n - r))
+            + (x - 1) ** 2 * (n1**2 + 2 * n1 * r - n1 + r**2 - r)
+        )
         return A1.T, A2.T
 
-    def fit_CST(self, y_coords, n_x=129):
-        A0 = self.A0_matrix()
+    @staticmethod
+    def _split_te(y_coords, n_x):
+        """
+        Split y into upper (TE -> LE, reversed to LE -> TE) and lower
+        surfaces and compute the trailing-edge half gap shared by every
+        fit_CST* variant.
+        """
         yu = y_coords[:n_x][::-1]
         yl = y_coords[n_x - 1 :]
         te = (yu[-1] - yl[-1]) / 2
-        au = lstsq(A0, yu - self.x_coords * yu[-1], rcond=None)[0]
-        al = lstsq(A0, yl - self.x_coords * yl[-1], rcond=None)[0]
+        return yu, yl, te
+
+    def fit_CST(self, y_coords, n_x=129):
+        yu, yl, te = self._split_te(y_coords, n_x)
+        au = self.A0_pinv @ (yu - self.x_coords * yu[-1])
+        al = self.A0_pinv @ (yl - self.x_coords * yl[-1])
         return au, al, te
 
     def fit_CST_up(self, y_coords, n_x=129):
-        A0 = self.A0_matrix()
-        yu = y_coords[:n_x][::-1]
-        yl = y_coords[n_x - 1 :]
-        te = (yu[-1] - yl[-1]) / 2
-        au = lstsq(A0, yu - self.x_coords * yu[-1], rcond=None)[0]
-        # al = lstsq(A0,yl-self.x_coords*yl[-1],rcond=None)[0]
+        yu, _, te = self._split_te(y_coords, n_x)
+        au = self.A0_pinv @ (yu - self.x_coords * yu[-1])
         return au, te
 
     def fit_CST_low(self, y_coords, n_x=129):
-        A0 = self.A0_matrix()
-        yu = y_coords[:n_x][::-1]
-        yl = y_coords[n_x - 1 :]
-        te = (yu[-1] - yl[-1]) / 2
-        # au = lstsq(A0,yu-self.x_coords*yu[-1],rcond=None)[0]
-        al = lstsq(A0, yl - self.x_coords * yl[-1], rcond=None)[0]
+        _, yl, te = self._split_te(y_coords, n_x)
+        al = self.A0_pinv @ (yl - self.x_coords * yl[-1])
         return al, te
 
 
+# dense evaluation grid shared by every parsec extraction
+_X2 = np.arange(0, 1.001, 0.0001)
+
+
+@lru_cache(maxsize=1)
+def _x2_cst_layer():
+    """CSTLayer on the fixed _X2 grid, built lazily once per process."""
+    return CSTLayer(n_cst=12, x_coords=_X2)
+
+
+def _cst_layer_for(x_coords, n_cst=12):
+    """
+    Memoized CSTLayer construction keyed on the raw grid bytes.
+    Airfoils in a dataset share the same x grids, so the design matrix and
+    its pseudoinverse are built once per unique grid instead of per airfoil.
+    """
+    return _cst_layer_cached(x_coords.tobytes(), x_coords.dtype.str, n_cst)
+
+
+@lru_cache(maxsize=8)
+def _cst_layer_cached(x_bytes, x_dtype, n_cst):
+    return CSTLayer(n_cst=n_cst, x_coords=np.frombuffer(x_bytes, dtype=x_dtype))
+
+
+@njit(cache=True, fastmath=True)
+def _parsec_kernel(x, y, x_fit, A0_pinv, A0_eval, x2):
+    """
+    Pure numeric core of Fit_airfoil.get_parsec_n15, jit-compiled when
+    numba is installed. Takes the precomputed design matrices so no
+    object-mode code is needed inside. Returns the 15 parsec features
+    plus the residual of the algebraic LE circle fit, so the caller can
+    fall back to the iterative fit on degenerate input.
+    """
+    # atan2 on the raw differences is robust to a vertical trailing edge,
+    # where the slope division would blow up
+    angle = math.degrees(math.atan2(y[0] - y[1], x[0] - x[1]))
+
+    yu = np.ascontiguousarray(y[:129][::-1])
+    yl = np.ascontiguousarray(y[128:])
+    te = (yu[-1] - yl[-1]) / 2
+    au = A0_pinv @ (yu - x_fit * yu[-1])
+    al = A0_pinv @ (yl - x_fit * yl[-1])
+
+    yu_eval = A0_eval @ au + x2 * te
+    yl_eval = A0_eval @ al - x2 * te
+    t4u = yu_eval[400]
+    t25u = yu_eval[2500]
+    t60u = yu_eval[6000]
+    t4l = yl_eval[400]
+    t25l = yl_eval[2500]
+    t60l = yl_eval[6000]
+
+    yumax = yu_eval.max()
+    ylmax = yl_eval.min()
+    xumax = x2[np.argmax(yu_eval)]
+    xlmax = x2[np.argmin(yl_eval)]
+    yr = yl_eval.max()
+    xr = x2[np.argmax(yl_eval)]
+
+    # Kasa algebraic circle fit over the five LE points (see fit_le_circle)
+    A = np.empty((5, 3))
+    rhs = np.empty(5)
+    for i in range(5):
+        A[i, 0] = 2 * x[126 + i]
+        A[i, 1] = 2 * y[126 + i]
+        A[i, 2] = 1.0
+        rhs[i] = x[126 + i] ** 2 + y[126 + i] ** 2
+    AtA = A.T @ A
+    # exactly collinear points make the normal matrix singular; solve would
+    # raise (and a raise from inside a prange batch is fatal), so guard on
+    # the determinant and hand the row to the caller's fallback instead
+    scale = np.abs(AtA).max()
+    if abs(np.linalg.det(AtA)) <= 1e-16 * scale * scale * scale:
+        rf = np.nan
+        circle_residual = np.inf
+    else:
+        sol = np.linalg.solve(AtA, A.T @ rhs)
+        ca, cb, cc = sol[0], sol[1], sol[2]
+        rf = math.sqrt(max(ca * ca + cb * cb + cc, 0.0))
+        circle_residual = 0.0
+        for i in range(5):
+            d = math.sqrt((x[126 + i] - ca) ** 2 + (y[126 + i] - cb) ** 2) - rf
+            circle_residual += d * d
+
+    features = np.array(
+        [
+            rf,
+            t4u,
+            t4l,
+            xumax,
+            yumax,
+            xlmax,
+            ylmax,
+            t25u,
+            t25l,
+            angle,
+            te,
+            xr,
+            yr,
+            t60u,
+            t60l,
+        ]
+    )
+    return features, circle_residual
+
+
+@njit(cache=True, parallel=True)
+def _parsec_batch_kernel(xs, ys, x_fit, A0_pinv, A0_eval, x2, features, residuals):
+    for i in prange(xs.shape[0]):
+        features[i], residuals[i] = _parsec_kernel(
+            xs[i], ys[i], x_fit, A0_pinv, A0_eval, x2
+        )
+
+
+def fit_parsec_n15_batch(airfoils):
+    """
+    Extract parsec features for a batch of airfoils sharing one x grid.
+    airfoils (n_airfoils, npoints, 2); returns (n_airfoils, 15).
+    Runs the jit kernel in parallel across airfoils when numba is installed.
+    """
+    airfoils = np.ascontiguousarray(airfoils, dtype=np.float64)
+    x_fit = np.ascontiguousarray(airfoils[0, :129, 0][::-1])
+    cst = _cst_layer_for(x_fit, n_cst=12)
+    cst2 = _x2_cst_layer()
+
+    features = np.empty((airfoils.shape[0], 15))
+    residuals = np.empty(airfoils.shape[0])
+    _parsec_batch_kernel(
+        np.ascontiguousarray(airfoils[:, :, 0]),
+        np.ascontiguousarray(airfoils[:, :, 1]),
+        x_fit,
+        cst.A0_pinv,
+        cst2.A0,
+        _X2,
+        features,
+        residuals,
+    )
+    bad = ~np.isfinite(residuals) | (residuals > 1e-6)
+    for i in np.flatnonzero(bad):
+        features[i, 0] = Fit_airfoil.fit_le_circle(
+            airfoils[i, 126:131, 0], airfoils[i, 126:131, 1]
+        )
+    return features
+
+
 class Fit_airfoil:
     """
     Fit airfoil by 3 order Bspline and extract Parsec features.
@@ -115,38 +267,46 @@ class Fit_airfoil:
 
     def get_parsec_n15(self):
         data = self.data
-        x = data[:, 0]
-        y = data[:, 1]
-
-        a = (data[0, 1] - data[1, 1]) / (data[0, 0] - data[1, 0])
-        theta_radians = math.atan(a)
-        theta_degrees = math.degrees(theta_radians)
-        angle = theta_degrees
-
-        cst = CSTLayer(n_cst=12, x_coords=x[:129][::-1])
-        au, al, te = cst.fit_CST(y, n_x=129)
-        x2 = np.arange(0, 1.001, 0.0001)
-        cst2 = CSTLayer(n_cst=12, x_coords=x2)
-        yu = cst2.A0.dot(au) + cst2.x_coords * te
-        yl = cst2.A0.dot(al) - cst2.x_coords * te
-        t4u = yu[400]
-        t25u = yu[2500]
-        t60u = yu[6000]
-        t4l = yl[400]
-        t25l = yl[2500]
-        t60l = yl[6000]
-        te1 = te
-
-        yumax = yu.max()
-        ylmax = yl.min()
-        xumax = x2[np.argmax(yu)]
-        xlmax = x2[np.argmin(yl)]
-        yr = yl.max()
-        xr = x2[np.argmax(yl)]
-
-        points = data[126:131, :]
-        xdata = points[:, 0]
-        ydata = points[:, 1]
+        x = np.ascontiguousarray(data[:, 0], dtype=np.float64)
+        y = np.ascontiguousarray(data[:, 1], dtype=np.float64)
+
+        x_fit = np.ascontiguousarray(x[:129][::-1])
+        cst = _cst_layer_for(x_fit, n_cst=12)
+        cst2 = _x2_cst_layer()
+
+        features, circle_residual = _parsec_kernel(
+            x, y, x_fit, cst.A0_pinv, cst2.A0, _X2
+        )
+        if not np.isfinite(circle_residual) or circle_residual > 1e-6:
+            features[0] = Fit_airfoil.fit_le_circle(
+                data[126:131, 0], data[126:131, 1]
+            )
+        return features
+
+    @staticmethod
+    def fit_le_circle(xdata, ydata, residual_tol=1e-6):
+        """
+        Kasa algebraic circle fit: solve [2x 2y 1].[a b c]^T = x^2+y^2,
+        then r = sqrt(a^2+b^2+c). Closed form, no iterative optimizer.
+        Falls back to the Nelder-Mead fit when the points are degenerate
+        (nearly collinear) or the geometric residual is large.
+        """
+        A = np.column_stack([2 * xdata, 2 * ydata, np.ones(len(xdata))])
+        rhs = xdata**2 + ydata**2
+        try:
+            a, b, c = np.linalg.solve(A.T @ A, A.T @ rhs)
+        except np.linalg.LinAlgError:
+            return Fit_airfoil.fit_le_circle_nelder_mead(xdata, ydata)
+        r = math.sqrt(max(a * a + b * b + c, 0.0))
+        residual = np.sum(
+            (np.sqrt((xdata - a) ** 2 + (ydata - b) ** 2) - r) ** 2
+        )
+        if not np.isfinite(residual) or residual > residual_tol:
+            return Fit_airfoil.fit_le_circle_nelder_mead(xdata, ydata)
+        return r
+
+    @staticmethod
+    def fit_le_circle_nelder_mead(xdata, ydata):
         initial_guess = (0.0025, 0, np.std([xdata, ydata]))
         result = minimize(
             Fit_airfoil.objective,
@@ -155,27 +315,7 @@ class Fit_airfoil:
             method="Nelder-Mead",
         )
         xc, yc, r = result.x
-        rf = r
-        # breakpoint()
-        return np.array(
-            [
-                rf,
-                t4u,
-                t4l,
-                xumax,
-                yumax,
-                xlmax,
-                ylmax,
-                t25u,
-                t25l,
-                angle,
-                te1,
-                xr,
-                yr,
-                t60u,
-                t60l,
-            ]
-        )
+        return r
 
     @staticmethod
     def objective(params, x, y):
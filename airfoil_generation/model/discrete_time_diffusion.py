@@ -11,17 +11,19 @@ class EMA:
     def __init__(self, decay):
         self.decay = decay
 
-    def update_average(self, old, new):
-        if old is None:
-            return new
-        return old * self.decay + (1 - self.decay) * new
+    @torch.no_grad()
+    def update_params(self, ema_params, current_params):
+        # multi-tensor kernels: two launches for the whole model instead of
+        # two per parameter
+        torch._foreach_mul_(ema_params, self.decay)
+        torch._foreach_add_(ema_params, current_params, alpha=1 - self.decay)
 
+    @torch.no_grad()
     def update_model_average(self, ema_model, current_model):
-        for current_params, ema_params in zip(
-            current_model.parameters(), ema_model.parameters()
-        ):
-            old, new = ema_params.data, current_params.data
-            ema_params.data = self.update_average(old, new)
+        self.update_params(
+            [p.data for p in ema_model.parameters()],
+            [p.data for p in current_model.parameters()],
+        )
 
 
 def generate_linear_schedule(T, low, high):
@@ -29,21 +31,10 @@ def generate_linear_schedule(T, low, high):
 
 
 def generate_cosine_schedule(T, s=0.008):
-    def f(t, T):
-        return (np.cos((t / T + s) / (1 + s) * np.pi / 2)) ** 2
-
-    alphas = []
-    f0 = f(0, T)
-
-    for t in range(T + 1):
-        alphas.append(f(t, T) / f0)
-
-    betas = []
-
-    for t in range(1, T + 1):
-        betas.append(min(1 - alphas[t] / alphas[t - 1], 0.999))
-
-    return np.array(betas)
+    t = np.arange(T + 1)
+    alphas = np.cos((t / T + s) / (1 + s) * np.pi / 2) ** 2
+    alphas = alphas / alphas[0]
+    return np.minimum(1 - alphas[1:] / alphas[:-1], 0.999)
 
 
 def generate_schedule(args):
@@ -60,9 +51,60 @@ def generate_schedule(args):
 
 
 def extract(a, t, x_shape):
-    b, *_ = t.shape
-    out = a.gather(-1, t)
-    return out.reshape(b, *((1,) * (len(x_shape) - 1)))
+    # advanced indexing on the 1-D table emits a single kernel, where
+    # gather(-1, t) built an intermediate result before the reshape
+    return a[t].view(t.shape[0], *((1,) * (len(x_shape) - 1)))
+
+
+# default compile mode on purpose: "reduce-overhead" wraps the step in CUDA
+# graphs, whose reused output buffers break callers that retain the result of
+# every step (sample_ddim_sequence) or mutate it in place (repaint)
+@torch.compile(fullgraph=True)
+def _ddim_step(
+    x,
+    pred_noise,
+    sqrt_alpha_cumprod_t,
+    sqrt_one_minus_alpha_cumprod_t,
+    sqrt_alpha_cumprod_t_prev,
+    dir_coef_t,
+    sigma_t,
+    noise,
+    clip_denoised,
+):
+    """
+    One fused DDIM update (formula (12) of the DDIM paper), compiled so the
+    elementwise kernels per step collapse into one. All schedule values
+    arrive pre-square-rooted as 0-dim tensors (dir_coef_t is
+    sqrt(1 - alpha_cumprod_prev - sigma^2)), so the graph is reused across
+    steps and no constant math is recomputed on the hot path.
+    """
+    # get the predicted x_0
+    pred_x0 = (x - sqrt_one_minus_alpha_cumprod_t * pred_noise) / sqrt_alpha_cumprod_t
+    if clip_denoised:
+        pred_x0 = torch.clamp(pred_x0, min=-1.0, max=1.0)
+    # direction pointing to x_t, then x_{t-1} of formula (12)
+    return sqrt_alpha_cumprod_t_prev * pred_x0 + dir_coef_t * pred_noise + sigma_t * noise
+
+
+@torch.compile(fullgraph=True)
+def _ddim_step_deterministic(
+    x,
+    pred_noise,
+    sqrt_alpha_cumprod_t,
+    sqrt_one_minus_alpha_cumprod_t,
+    sqrt_alpha_cumprod_t_prev,
+    dir_coef_t,
+    clip_denoised,
+):
+    """
+    _ddim_step specialized for ddim_eta == 0 (the default): sigma is
+    identically zero, so the noise term — and its randn allocation — drop
+    out entirely and dir_coef_t reduces to sqrt(1 - alpha_cumprod_prev).
+    """
+    pred_x0 = (x - sqrt_one_minus_alpha_cumprod_t * pred_noise) / sqrt_alpha_cumprod_t
+    if clip_denoised:
+        pred_x0 = torch.clamp(pred_x0, min=-1.0, max=1.0)
+    return sqrt_alpha_cumprod_t_prev * pred_x0 + dir_coef_t * pred_noise
 
 
 class PointDiTDiffusion(nn.Module):
@@ -82,6 +124,9 @@ class PointDiTDiffusion(nn.Module):
         ema_decay (float): model weights exponential moving average decay
         ema_start (int): number of steps before EMA
         ema_update_rate (int): number of steps before each EMA update
+        ema_device (str): optional device for the EMA copy, e.g. "cpu" to
+            free GPU memory for larger batches; updates are staged through
+            pinned host memory
     """
 
     def __init__(
@@ -94,6 +139,7 @@ class PointDiTDiffusion(nn.Module):
         ema_decay=0.9999,
         ema_start=5000,
         ema_update_rate=1,
+        ema_device=None,
     ):
         super().__init__()
 
@@ -106,6 +152,11 @@ class PointDiTDiffusion(nn.Module):
         self.ema_update_rate = ema_update_rate
         self.step = 0
 
+        self.ema_device = ema_device
+        self._ema_staging = None
+        if ema_device is not None:
+            self._offload_ema()
+
         self.latent_size = latent_size
         self.channels = channels
 
@@ -137,13 +188,152 @@ class PointDiTDiffusion(nn.Module):
         )
         self.register_buffer("sigma", to_torch(np.sqrt(betas)))
 
+        # DDIM per-step schedule constants: deterministic functions of the
+        # beta schedule and ddim_timesteps, so compute them once here instead
+        # of on every sample_ddim call. ddim_eta stays a runtime attribute;
+        # only the eta-independent sigma coefficient is precomputed.
+        # short schedules (num_timesteps < 50) must stay constructible for
+        # DDPM training/sampling: cap the DDIM step count at the schedule
+        # length so the stride below is never zero
+        self.ddim_timesteps = min(self.ddim_timesteps, self.num_timesteps)
+        c = self.num_timesteps // self.ddim_timesteps
+        ddim_timestep_seq = np.asarray(list(range(0, self.num_timesteps, c)))
+        # add one to get the final alpha values right (the ones from first
+        # scale to data during sampling), clamped so the last step cannot
+        # index past the end of the alphas_cumprod table
+        ddim_timestep_seq = np.minimum(ddim_timestep_seq + 1, self.num_timesteps - 1)
+        # previous sequence
+        ddim_timestep_prev_seq = np.append(np.array([0]), ddim_timestep_seq[:-1])
+        self.ddim_timestep_seq = ddim_timestep_seq
+        self.ddim_timestep_prev_seq = ddim_timestep_prev_seq
+
+        ddim_alpha_cumprod = alphas_cumprod[ddim_timestep_seq]
+        ddim_alpha_cumprod_prev = alphas_cumprod[ddim_timestep_prev_seq]
+        # persistent=False: derived from betas in __init__, keeping state
+        # dicts interchangeable with checkpoints saved before these existed
+        self.register_buffer(
+            "ddim_alpha_cumprod_prev",
+            to_torch(ddim_alpha_cumprod_prev),
+            persistent=False,
+        )
+        # pre-square-rooted tables so the sampling step does no sqrt at all
+        self.register_buffer(
+            "ddim_sqrt_alpha_cumprod",
+            to_torch(np.sqrt(ddim_alpha_cumprod)),
+            persistent=False,
+        )
+        self.register_buffer(
+            "ddim_sqrt_one_minus_alpha_cumprod",
+            to_torch(np.sqrt(1 - ddim_alpha_cumprod)),
+            persistent=False,
+        )
+        self.register_buffer(
+            "ddim_sqrt_alpha_cumprod_prev",
+            to_torch(np.sqrt(ddim_alpha_cumprod_prev)),
+            persistent=False,
+        )
+        self.register_buffer(
+            "ddim_sqrt_one_minus_alpha_cumprod_prev",
+            to_torch(np.sqrt(1 - ddim_alpha_cumprod_prev)),
+            persistent=False,
+        )
+        # repaint (fix_indices) path: the ground truth is perturbed at t-1,
+        # another deterministic per-step sequence
+        self.register_buffer(
+            "ddim_repaint_sqrt_alpha_cumprod",
+            to_torch(np.sqrt(alphas_cumprod[ddim_timestep_seq - 1])),
+            persistent=False,
+        )
+        self.register_buffer(
+            "ddim_repaint_sqrt_one_minus_alpha_cumprod",
+            to_torch(np.sqrt(1 - alphas_cumprod[ddim_timestep_seq - 1])),
+            persistent=False,
+        )
+        # σ_t(η) = η * this (formula (16) of the DDIM paper)
+        self.register_buffer(
+            "ddim_sigma_coef",
+            to_torch(
+                np.sqrt(
+                    (1 - ddim_alpha_cumprod_prev)
+                    / (1 - ddim_alpha_cumprod)
+                    * (1 - ddim_alpha_cumprod / ddim_alpha_cumprod_prev)
+                )
+            ),
+            persistent=False,
+        )
+
+    def _offload_ema(self):
+        self.ema_model.to(self.ema_device)
+        if torch.device(self.ema_device).type == "cpu" and torch.cuda.is_available():
+            # pin the EMA copy and a staging buffer so the device-to-host
+            # parameter copies run asynchronously
+            for p in self.ema_model.parameters():
+                p.data = p.data.pin_memory()
+            if self._ema_staging is None:
+                self._ema_staging = [
+                    torch.empty_like(p.data, device="cpu").pin_memory()
+                    for p in self.model.parameters()
+                ]
+
+    @torch.no_grad()
     def update_ema(self):
         self.step += 1
-        if self.step % self.ema_update_rate == 0:
-            if self.step < self.ema_start:
-                self.ema_model.load_state_dict(self.model.state_dict())
-            else:
-                self.ema.update_model_average(self.ema_model, self.model)
+        if self.step % self.ema_update_rate != 0:
+            return
+
+        if (
+            self.ema_device is not None
+            and next(self.ema_model.parameters()).device
+            != torch.device(self.ema_device)
+        ):
+            # a module-level .to() dragged the EMA copy along; push it back
+            self._offload_ema()
+
+        current_params = [p.data for p in self.model.parameters()]
+        if self._ema_staging is not None and current_params[0].is_cuda:
+            # queue all device-to-host copies into pinned staging, one sync,
+            # then the fused update runs host-side against the staged weights
+            for staging, current in zip(self._ema_staging, current_params):
+                staging.copy_(current, non_blocking=True)
+            torch.cuda.synchronize()
+            current_params = self._ema_staging
+
+        ema_params = [p.data for p in self.ema_model.parameters()]
+        if self.step < self.ema_start:
+            torch._foreach_copy_(ema_params, current_params)
+            for ema_buffer, buffer in zip(
+                self.ema_model.buffers(), self.model.buffers()
+            ):
+                ema_buffer.copy_(buffer)
+        else:
+            self.ema.update_params(ema_params, current_params)
+
+    def _sampling_model(self, use_ema, device):
+        """
+        Model driven by the sampling loops. With an offloaded EMA copy, a
+        throwaway replica is materialized on the sampling device.
+        """
+        if not use_ema:
+            return self.model
+        if (
+            self.ema_device is not None
+            and torch.device(self.ema_device).type != torch.device(device).type
+        ):
+            return deepcopy(self.ema_model).to(device)
+        return self.ema_model
+
+    @staticmethod
+    def _sampling_dtype(dtype, device):
+        """
+        Default inference dtype: bf16 on CUDA (halves bandwidth for the
+        elementwise ops and doubles tensor-core throughput for the model
+        call), fp32 elsewhere.
+        """
+        if dtype is not None:
+            return dtype
+        if torch.device(device).type == "cuda":
+            return torch.bfloat16
+        return torch.float32
 
     @torch.no_grad()
     def remove_noise(self, x, t, y, use_ema=True):
@@ -167,188 +357,289 @@ class PointDiTDiffusion(nn.Module):
         clip_denoised=True,
         gt=None,
         fix_indices=None,
+        dtype=None,
+        verbose=True,
+        return_device=None,
     ):
         if y is not None and batch_size != len(y):
             raise ValueError("sample batch size different from length of given y")
+        dtype = self._sampling_dtype(dtype, device)
         ddim_timesteps = self.ddim_timesteps
-        c = self.num_timesteps // ddim_timesteps
-        ddim_timestep_seq = np.asarray(list(range(0, self.num_timesteps, c)))
+        ddim_timestep_seq = self.ddim_timestep_seq
+
+        # schedule constants precomputed in __init__; only the eta scaling
+        # of sigma (and the direction coefficient derived from it) is applied
+        # per call. Cast to the sampling dtype so the inner-loop arithmetic
+        # stays half precision; the fp32 buffers are untouched for training
+        # math.
+        sqrt_alpha_cumprod_seq = self.ddim_sqrt_alpha_cumprod.to(dtype)
+        sqrt_one_minus_alpha_cumprod_seq = self.ddim_sqrt_one_minus_alpha_cumprod.to(
+            dtype
+        )
+        sqrt_alpha_cumprod_prev_seq = self.ddim_sqrt_alpha_cumprod_prev.to(dtype)
+        deterministic = self.ddim_eta == 0
+        if deterministic:
+            # sigma is identically zero: the direction coefficient is a
+            # precomputed table and no per-step noise is drawn
+            sigma_seq = None
+            dir_coef_seq = self.ddim_sqrt_one_minus_alpha_cumprod_prev.to(dtype)
+        else:
+            sigma_seq = self.ddim_eta * self.ddim_sigma_coef
+            dir_coef_seq = torch.sqrt(
+                1 - self.ddim_alpha_cumprod_prev - sigma_seq**2
+            ).to(dtype)
+            sigma_seq = sigma_seq.to(dtype)
 
-        # add one to get the final alpha values right (the ones from first scale to data during sampling)
-        ddim_timestep_seq = ddim_timestep_seq + 1
-        # previous sequence
-        ddim_timestep_prev_seq = np.append(np.array([0]), ddim_timestep_seq[:-1])
+        model = self._sampling_model(use_ema, device)
 
         # start from pure noise (for each example in the batch)
-        x = torch.randn(batch_size, self.latent_size, self.channels, device=device)
-        for i in tqdm(
-            reversed(range(0, ddim_timesteps)),
-            desc="sampling loop time step",
-            total=ddim_timesteps,
-        ):
-            t = torch.full(
-                (batch_size,), ddim_timestep_seq[i], device=device, dtype=torch.long
-            )
-            prev_t = torch.full(
-                (batch_size,),
-                ddim_timestep_prev_seq[i],
-                device=device,
-                dtype=torch.long,
-            )
-
-            # 1. get current and previous alpha_cumprod
-            alpha_cumprod_t = extract(self.alphas_cumprod, t, x.shape)
-            alpha_cumprod_t_prev = extract(self.alphas_cumprod, prev_t, x.shape)
-
-            # 2. predict noise using model
-            if use_ema:
-                pred_noise = self.ema_model(x, t, y)
-            else:
-                pred_noise = self.model(x, t, y)
-
-            # 3. get the predicted x_0
-            pred_x0 = (
-                x - torch.sqrt((1.0 - alpha_cumprod_t)) * pred_noise
-            ) / torch.sqrt(alpha_cumprod_t)
-            if clip_denoised:
-                pred_x0 = torch.clamp(pred_x0, min=-1.0, max=1.0)
-
-            # 4. compute variance: "sigma_t(η)" -> see formula (16)
-            # σ_t = sqrt((1 − α_t−1)/(1 − α_t)) * sqrt(1 − α_t/α_t−1)
-            sigmas_t = self.ddim_eta * torch.sqrt(
-                (1 - alpha_cumprod_t_prev)
-                / (1 - alpha_cumprod_t)
-                * (1 - alpha_cumprod_t / alpha_cumprod_t_prev)
-            )
-
-            # 5. compute "direction pointing to x_t" of formula (12)
-            pred_dir_xt = (
-                torch.sqrt(1 - alpha_cumprod_t_prev - sigmas_t**2) * pred_noise
+        x = torch.randn(
+            batch_size, self.latent_size, self.channels, device=device, dtype=dtype
+        )
+        if fix_indices is not None:
+            gt_noise_buf = torch.empty_like(gt)
+        if not deterministic:
+            # one batched draw for the whole trajectory instead of a fresh
+            # allocation per step
+            noises = torch.randn(
+                (ddim_timesteps,) + x.shape, device=device, dtype=dtype
             )
-
-            # 6. compute x_{t-1} of formula (12)
-            x_prev = (
-                torch.sqrt(alpha_cumprod_t_prev) * pred_x0
-                + pred_dir_xt
-                + sigmas_t * torch.randn_like(x)
+        autocast = torch.autocast(
+            device_type=torch.device(device).type,
+            dtype=dtype,
+            enabled=dtype != torch.float32,
+        )
+        iterator = range(ddim_timesteps - 1, -1, -1)
+        if verbose:
+            # mininterval keeps the bar from flushing to stderr on every
+            # short step of the hot loop
+            iterator = tqdm(
+                iterator,
+                desc="sampling loop time step",
+                total=ddim_timesteps,
+                mininterval=0.5,
             )
-            if fix_indices is not None:
-                gt_repaint = self.perturb_x(gt, t - 1, torch.randn_like(gt))
-                x_prev[:, fix_indices, 0] = gt_repaint[:, fix_indices, 0]
-
-            x = x_prev
-
-        return x.detach().cpu()
+        with autocast:
+            for i in iterator:
+                t = torch.full(
+                    (batch_size,), ddim_timestep_seq[i], device=device, dtype=torch.long
+                )
+
+                # predict noise using model, then apply the fused DDIM update
+                pred_noise = model(x, t, y)
+                if deterministic:
+                    x_prev = _ddim_step_deterministic(
+                        x,
+                        pred_noise,
+                        sqrt_alpha_cumprod_seq[i],
+                        sqrt_one_minus_alpha_cumprod_seq[i],
+                        sqrt_alpha_cumprod_prev_seq[i],
+                        dir_coef_seq[i],
+                        clip_denoised,
+                    )
+                else:
+                    x_prev = _ddim_step(
+                        x,
+                        pred_noise,
+                        sqrt_alpha_cumprod_seq[i],
+                        sqrt_one_minus_alpha_cumprod_seq[i],
+                        sqrt_alpha_cumprod_prev_seq[i],
+                        dir_coef_seq[i],
+                        sigma_seq[i],
+                        noises[i],
+                        clip_denoised,
+                    )
+                if fix_indices is not None:
+                    # perturb_x at t-1, with the schedule values read as
+                    # precomputed 0-dim scalars instead of gathered per batch
+                    gt_repaint = (
+                        self.ddim_repaint_sqrt_alpha_cumprod[i] * gt
+                        + self.ddim_repaint_sqrt_one_minus_alpha_cumprod[i]
+                        * gt_noise_buf.normal_()
+                    ).to(dtype)
+                    x_prev[:, fix_indices, 0] = gt_repaint[:, fix_indices, 0]
+
+                x = x_prev
+
+        # stay on the sampling device unless the caller asks otherwise, so
+        # downstream GPU work is not serialized behind a D2H copy
+        x = x.detach()
+        if return_device is not None:
+            x = x.to(return_device)
+        return x
 
     @torch.no_grad()
     def sample_ddim_sequence(
-        self, batch_size, device, y=None, use_ema=True, clip_denoised=True
+        self,
+        batch_size,
+        device,
+        y=None,
+        use_ema=True,
+        clip_denoised=True,
+        dtype=None,
+        verbose=True,
+        return_device=None,
     ):
         if y is not None and batch_size != len(y):
             raise ValueError("sample batch size different from length of given y")
+        dtype = self._sampling_dtype(dtype, device)
         ddim_timesteps = self.ddim_timesteps
-        c = self.num_timesteps // ddim_timesteps
-        ddim_timestep_seq = np.asarray(list(range(0, self.num_timesteps, c)))
+        ddim_timestep_seq = self.ddim_timestep_seq
+
+        # schedule constants precomputed in __init__; only the eta scaling
+        # of sigma (and the direction coefficient derived from it) is applied
+        # per call. Cast to the sampling dtype so the inner-loop arithmetic
+        # stays half precision; the fp32 buffers are untouched for training
+        # math.
+        sqrt_alpha_cumprod_seq = self.ddim_sqrt_alpha_cumprod.to(dtype)
+        sqrt_one_minus_alpha_cumprod_seq = self.ddim_sqrt_one_minus_alpha_cumprod.to(
+            dtype
+        )
+        sqrt_alpha_cumprod_prev_seq = self.ddim_sqrt_alpha_cumprod_prev.to(dtype)
+        deterministic = self.ddim_eta == 0
+        if deterministic:
+            # sigma is identically zero: the direction coefficient is a
+            # precomputed table and no per-step noise is drawn
+            sigma_seq = None
+            dir_coef_seq = self.ddim_sqrt_one_minus_alpha_cumprod_prev.to(dtype)
+        else:
+            sigma_seq = self.ddim_eta * self.ddim_sigma_coef
+            dir_coef_seq = torch.sqrt(
+                1 - self.ddim_alpha_cumprod_prev - sigma_seq**2
+            ).to(dtype)
+            sigma_seq = sigma_seq.to(dtype)
 
-        # add one to get the final alpha values right (the ones from first scale to data during sampling)
-        ddim_timestep_seq = ddim_timestep_seq + 1
-        # previous sequence
-        ddim_timestep_prev_seq = np.append(np.array([0]), ddim_timestep_seq[:-1])
+        model = self._sampling_model(use_ema, device)
 
         # start from pure noise (for each example in the batch)
 
-        x = torch.randn(batch_size, self.latent_size, self.channels, device=device)
+        x = torch.randn(
+            batch_size, self.latent_size, self.channels, device=device, dtype=dtype
+        )
         ans = [x]
-        for i in tqdm(
-            reversed(range(0, ddim_timesteps)),
-            desc="sampling loop time step",
-            total=ddim_timesteps,
-        ):
-            t = torch.full(
-                (batch_size,), ddim_timestep_seq[i], device=device, dtype=torch.long
-            )
-            prev_t = torch.full(
-                (batch_size,),
-                ddim_timestep_prev_seq[i],
-                device=device,
-                dtype=torch.long,
-            )
-
-            # 1. get current and previous alpha_cumprod
-            alpha_cumprod_t = extract(self.alphas_cumprod, t, x.shape)
-            alpha_cumprod_t_prev = extract(self.alphas_cumprod, prev_t, x.shape)
-
-            # 2. predict noise using model
-            if use_ema:
-                pred_noise = self.ema_model(x, t, y)
-            else:
-                pred_noise = self.model(x, t, y)
-
-            # 3. get the predicted x_0
-            pred_x0 = (
-                x - torch.sqrt((1.0 - alpha_cumprod_t)) * pred_noise
-            ) / torch.sqrt(alpha_cumprod_t)
-            if clip_denoised:
-                pred_x0 = torch.clamp(pred_x0, min=-1.0, max=1.0)
-
-            # 4. compute variance: "sigma_t(η)" -> see formula (16)
-            # σ_t = sqrt((1 − α_t−1)/(1 − α_t)) * sqrt(1 − α_t/α_t−1)
-            sigmas_t = self.ddim_eta * torch.sqrt(
-                (1 - alpha_cumprod_t_prev)
-                / (1 - alpha_cumprod_t)
-                * (1 - alpha_cumprod_t / alpha_cumprod_t_prev)
-            )
-
-            # 5. compute "direction pointing to x_t" of formula (12)
-            pred_dir_xt = (
-                torch.sqrt(1 - alpha_cumprod_t_prev - sigmas_t**2) * pred_noise
+        if not deterministic:
+            # one batched draw for the whole trajectory instead of a fresh
+            # allocation per step
+            noises = torch.randn(
+                (ddim_timesteps,) + x.shape, device=device, dtype=dtype
             )
-
-            # 6. compute x_{t-1} of formula (12)
-            x_prev = (
-                torch.sqrt(alpha_cumprod_t_prev) * pred_x0
-                + pred_dir_xt
-                + sigmas_t * torch.randn_like(x)
+        autocast = torch.autocast(
+            device_type=torch.device(device).type,
+            dtype=dtype,
+            enabled=dtype != torch.float32,
+        )
+        iterator = range(ddim_timesteps - 1, -1, -1)
+        if verbose:
+            # mininterval keeps the bar from flushing to stderr on every
+            # short step of the hot loop
+            iterator = tqdm(
+                iterator,
+                desc="sampling loop time step",
+                total=ddim_timesteps,
+                mininterval=0.5,
             )
-
-            x = x_prev
-            ans.append(x)
-
+        with autocast:
+            for i in iterator:
+                t = torch.full(
+                    (batch_size,), ddim_timestep_seq[i], device=device, dtype=torch.long
+                )
+
+                # predict noise using model, then apply the fused DDIM update
+                pred_noise = model(x, t, y)
+                if deterministic:
+                    x = _ddim_step_deterministic(
+                        x,
+                        pred_noise,
+                        sqrt_alpha_cumprod_seq[i],
+                        sqrt_one_minus_alpha_cumprod_seq[i],
+                        sqrt_alpha_cumprod_prev_seq[i],
+                        dir_coef_seq[i],
+                        clip_denoised,
+                    )
+                else:
+                    x = _ddim_step(
+                        x,
+                        pred_noise,
+                        sqrt_alpha_cumprod_seq[i],
+                        sqrt_one_minus_alpha_cumprod_seq[i],
+                        sqrt_alpha_cumprod_prev_seq[i],
+                        dir_coef_seq[i],
+                        sigma_seq[i],
+                        noises[i],
+                        clip_denoised,
+                    )
+                ans.append(x)
+
+        if return_device is not None:
+            ans = [step.to(return_device) for step in ans]
         return ans
 
     @torch.no_grad()
-    def sample(self, batch_size, device, y=None, use_ema=True):
+    def sample(self, batch_size, device, y=None, use_ema=True, return_device=None):
         if y is not None and batch_size != len(y):
             raise ValueError("sample batch size different from length of given y")
 
+        model = self._sampling_model(use_ema, device)
+        remove_noise_coeff = self.remove_noise_coeff
+        reciprocal_sqrt_alphas = self.reciprocal_sqrt_alphas
+        sigma = self.sigma
+
         x = torch.randn(batch_size, self.latent_size, self.channels, device=device)
+        t_batch = torch.empty(batch_size, dtype=torch.long, device=device)
+        # scratch noise refilled in place each step; a (num_timesteps, ...)
+        # batch would be too large for the 1000-step DDPM loop
+        noise_buf = torch.empty_like(x)
 
         for t in range(self.num_timesteps - 1, -1, -1):
-            t_batch = torch.tensor([t], device=device).repeat(batch_size)
-            x = self.remove_noise(x, t_batch, y, use_ema)
+            t_batch.fill_(t)
+            # remove_noise, with the schedule read as 0-dim scalars instead
+            # of gathered per-batch tensors
+            x = (x - remove_noise_coeff[t] * model(x, t_batch, y)) * (
+                reciprocal_sqrt_alphas[t]
+            )
 
             if t > 0:
-                x += extract(self.sigma, t_batch, x.shape) * torch.randn_like(x)
+                x += sigma[t] * noise_buf.normal_()
 
-        return x.cpu().detach()
+        x = x.detach()
+        if return_device is not None:
+            x = x.to(return_device)
+        return x
 
     @torch.no_grad()
-    def sample_diffusion_sequence(self, batch_size, device, y=None, use_ema=True):
+    def sample_diffusion_sequence(
+        self, batch_size, device, y=None, use_ema=True, return_device=None
+    ):
         if y is not None and batch_size != len(y):
             raise ValueError("sample batch size different from length of given y")
 
+        model = self._sampling_model(use_ema, device)
+        remove_noise_coeff = self.remove_noise_coeff
+        reciprocal_sqrt_alphas = self.reciprocal_sqrt_alphas
+        sigma = self.sigma
+
         x = torch.randn(batch_size, self.latent_size, self.channels, device=device)
-        diffusion_sequence = [x.cpu().detach()]
+        diffusion_sequence = [x.detach()]
+        t_batch = torch.empty(batch_size, dtype=torch.long, device=device)
+        noise_buf = torch.empty_like(x)
 
         for t in range(self.num_timesteps - 1, -1, -1):
-            t_batch = torch.tensor([t], device=device).repeat(batch_size)
-            x = self.remove_noise(x, t_batch, y, use_ema)
+            t_batch.fill_(t)
+            x = (x - remove_noise_coeff[t] * model(x, t_batch, y)) * (
+                reciprocal_sqrt_alphas[t]
+            )
 
             if t > 0:
-                x += extract(self.sigma, t_batch, x.shape) * torch.randn_like(x)
+                x += sigma[t] * noise_buf.normal_()
 
-            diffusion_sequence.append(x.cpu().detach())
+            # each iteration rebinds x to a fresh tensor, so retaining the
+            # reference needs no clone and, crucially, no per-step D2H sync
+            diffusion_sequence.append(x.detach())
 
+        if return_device is not None:
+            diffusion_sequence = [
+                step.to(return_device) for step in diffusion_sequence
+            ]
         return diffusion_sequence
 
     def perturb_x(self, x, t, noise):
@@ -360,15 +651,16 @@ class PointDiTDiffusion(nn.Module):
     def get_losses(self, x, t, y):
         noise = torch.randn_like(x)
 
-        perturbed_x = self.perturb_x(x, t, noise)
+        # perturb_x inlined with direct per-batch indexing (one index kernel
+        # per table instead of gather+reshape through extract); the old
+        # x_0_pred reconstruction was dead code — only loss_noise is returned
+        shape = (-1,) + (1,) * (x.ndim - 1)
+        perturbed_x = (
+            self.sqrt_alphas_cumprod[t].view(shape) * x
+            + self.sqrt_one_minus_alphas_cumprod[t].view(shape) * noise
+        )
         estimated_noise = self.model(perturbed_x, t, y)
 
-        x_0_pred = (
-            perturbed_x
-            - torch.sqrt((1.0 - extract(self.alphas_cumprod, t, x.shape)))
-            * estimated_noise
-        ) / torch.sqrt(extract(self.alphas_cumprod, t, x.shape))
-
         if self.loss_type == "l1":
             loss_noise = F.l1_loss(estimated_noise, noise)
         elif self.loss_type == "l2":